@@ -1,6 +1,24 @@
 import streamlit as st
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.dates as mdates
+import io
+
+plt.ioff()
+
+@st.cache_data
+def load_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse the uploaded CSV once and reuse it across reruns"""
+    try:
+        return pd.read_csv(io.BytesIO(file_bytes), engine='pyarrow')
+    except ImportError:
+        return pd.read_csv(io.BytesIO(file_bytes), engine='c',
+                           low_memory=False, cache_dates=True)
+
 
 st.title('NOA Data Explorer')
 st.text('This is a web app to explore NOA Daily data')
@@ -10,7 +28,7 @@ uploaded_file = st.sidebar.file_uploader('Upload your file here')
 
 if uploaded_file:
     st.header('NOA Daily Data Statistics')
-    df = pd.read_csv(uploaded_file)
+    df = load_csv(uploaded_file.getvalue())
     # Normalize column names
     df.columns = df.columns.str.strip().str.upper()
 
@@ -22,11 +40,13 @@ if uploaded_file:
 
 # Let the user pick a column to plot *This one worked
     #selected_column = st.selectbox("Select a column to plot against DAY", options=[col for col in df.columns if col != 'DAY'])
-# Convert columns to numeric & create datetime
-df['YEAR'] = pd.to_numeric(df['YEAR'], errors='coerce')
-df['MONTH'] = pd.to_numeric(df['MONTH'], errors='coerce')
-df['DAY'] = pd.to_numeric(df['DAY'], errors='coerce')
-df['DATE'] = pd.to_datetime(df[['YEAR', 'MONTH', 'DAY']], errors='coerce')
+# Convert columns to numeric & assemble datetime from the integer parts in one pass
+date_parts = df[['YEAR', 'MONTH', 'DAY']].apply(pd.to_numeric, errors='coerce')
+df[['YEAR', 'MONTH', 'DAY']] = date_parts
+df['DATE'] = pd.to_datetime(
+    dict(year=date_parts['YEAR'], month=date_parts['MONTH'], day=date_parts['DAY']),
+    errors='coerce', cache=True
+)
 # Plot the selected column
    # fig, ax = plt.subplots()
     #ax.plot(df['DAY'], df[selected_column], marker='o')
@@ -55,11 +75,27 @@ df_filtered = df_filtered.dropna(subset=['DATE', variable])
 #    ax.set_ylabel('Max Temperature')
 #    ax.set_title('Daily Max Temperature')
 # Plot
-fig, ax = plt.subplots()
-ax.plot(df_filtered['DATE'], df_filtered[variable], marker='o', markersize=3)
+fig = Figure()
+FigureCanvasAgg(fig)
+ax = fig.subplots()
+
+# Resample to roughly one point per pixel when the series is much denser than the figure
+n_px = int(fig.get_size_inches()[0] * fig.dpi)
+df_plot = df_filtered
+if len(df_filtered) > n_px * 2 and pd.api.types.is_numeric_dtype(df_filtered[variable]):
+    span_days = (df_filtered['DATE'].max() - df_filtered['DATE'].min()).days
+    rule = f"{max(1, span_days // n_px)}D"
+    df_plot = df_filtered.set_index('DATE')[[variable]].resample(rule).mean().dropna().reset_index()
+
+# Markers dominate draw time for long daily series
+marker = 'o' if len(df_plot) <= 2000 else None
+ax.plot(df_plot['DATE'], df_plot[variable], marker=marker, markersize=3)
 ax.set_xlabel('Date')
 ax.set_ylabel(variable.title())
 ax.set_title(f"{variable.title()} for Month: {selected_month}" if selected_month != 'All' else f"{variable.title()} - All Months")
 ax.grid(True)
-fig.autofmt_xdate()
+locator = mdates.AutoDateLocator()
+ax.xaxis.set_major_locator(locator)
+ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+ax.tick_params(axis='x', labelrotation=30)
 st.pyplot(fig)
\ No newline at end of file
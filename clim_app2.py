@@ -1,17 +1,54 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.colors as mcolors
 from matplotlib.cm import ScalarMappable
 import io
 from datetime import datetime
 
+plt.ioff()
+
 # Configure the app
 st.set_page_config(page_title="Plots Generator", page_icon="🌍", layout="wide")
 st.title(":earth_africa: Plots Generator")
 st.markdown("Make climate stripes plots using temperature data. Created by **Dimitris Katsanos**")
 
+@st.cache_data
+def load_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse the uploaded CSV once and reuse it across reruns"""
+    try:
+        return pd.read_csv(io.BytesIO(file_bytes), engine='pyarrow')
+    except ImportError:
+        return pd.read_csv(io.BytesIO(file_bytes), engine='c',
+                           low_memory=False, cache_dates=True)
+
+
+@st.cache_resource
+def get_cmap_cached(name: str):
+    """Colormaps are shared singletons, so look each one up only once"""
+    return plt.get_cmap(name)
+
+
+def get_norm(vmin, vmax):
+    """Reuse this session's norm until the color range changes"""
+    if st.session_state.get('norm_range') != (vmin, vmax):
+        st.session_state['norm'] = mcolors.Normalize(vmin=vmin, vmax=vmax)
+        st.session_state['norm_range'] = (vmin, vmax)
+    return st.session_state['norm']
+
+
+def bin_average(values, n_bins):
+    """Average consecutive values into at most n_bins columns"""
+    if values.size <= n_bins:
+        return values
+    edges = np.linspace(0, values.size, n_bins + 1).astype(int)
+    return np.add.reduceat(values, edges[:-1]) / np.diff(edges).astype(values.dtype)
+
 # Sidebar with controls
 with st.sidebar:
     st.header("Upload Data")
@@ -67,7 +104,7 @@ st.sidebar.download_button(
 
 if uploaded_file is not None:
     try:
-        df = pd.read_csv(uploaded_file)
+        df = load_csv(uploaded_file.getvalue())
 
         if 'Year' not in df.columns or 'Temperature' not in df.columns:
             st.error("CSV must contain 'Year' and 'Temperature' columns")
@@ -90,16 +127,23 @@ if uploaded_file is not None:
             st.dataframe(df.head(10))
             st.caption(f"Data range: {min_year} to {max_year} ({len(df)} years)")
 
-        fig, ax = plt.subplots(figsize=(15, stripe_height*0.5))
+        fig = Figure(figsize=(15, stripe_height*0.5))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
 
         vmin = color_min if set_color_range else df['Temperature'].min()
         vmax = color_max if set_color_range else df['Temperature'].max()
-        norm = mcolors.Normalize(vmin=vmin, vmax=vmax)
-        cmap = plt.get_cmap(colormap)
-
-        for i, row in df.iterrows():
-            color = cmap(norm(row['Temperature']))
-            ax.fill_between([i, i+1], 0, 1, color=color)
+        norm = get_norm(vmin, vmax)
+        cmap = get_cmap_cached(colormap)
+
+        # Draw all stripes as a single 1xN image instead of one polygon per year
+        # Never draw more stripes than the exported image has pixels
+        n_px = int(fig.get_size_inches()[0] * dpi)
+        arr = bin_average(df['Temperature'].to_numpy(dtype=np.float32), n_px)[np.newaxis, :]
+        im = ax.imshow(arr, aspect='auto', cmap=cmap, norm=norm,
+                       extent=[0, len(df), 0, 1], interpolation='nearest')
+        # Keep the stripes a single bitmap in SVG/PDF exports
+        im.set_rasterized(True)
 
         if ref_value is not None:
             ref_index = np.interp(ref_value, [vmin, vmax], [0, 1])
@@ -109,16 +153,20 @@ if uploaded_file is not None:
 
         ax.set_xlim(0, len(df))
         ax.set_ylim(0, 1)
-        ax.set_axis_off()
+        # Keep the x axis for year ticks but hide the frame and y axis
+        ax.spines[:].set_visible(False)
+        ax.set_yticks([])
+        ax.tick_params(axis='x', length=0)
 
         if show_years:
-            years = df['Year'].unique()
-            for i, year in enumerate(years):
-                if year % year_step == 0:
-                    ax.text(i + 0.5, -0.05, str(year), 
-                            rotation=90, ha='center', va='top', fontsize=10, alpha=0.7)
+            years = df['Year'].to_numpy()
+            mask = years % year_step == 0
+            ax.set_xticks(np.nonzero(mask)[0] + 0.5)
+            ax.set_xticklabels(years[mask].astype(str), rotation=90, fontsize=10, alpha=0.7)
+        else:
+            ax.set_xticks([])
 
-        plt.title(f"{custom_title}: {min_year} - {max_year}", fontsize=18, pad=20)
+        ax.set_title(f"{custom_title}: {min_year} - {max_year}", fontsize=18, pad=20)
 
         #cax = fig.add_axes([0.15, 0.85, 0.7, 0.03])
         #sm = ScalarMappable(norm=norm, cmap=cmap)
@@ -129,23 +177,29 @@ if uploaded_file is not None:
         cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.03, pad=0.02)
         cbar.set_label('Temperature Anomaly (°C)', fontsize=12)
 
-        st.pyplot(fig)
-
         buf = io.BytesIO()
         if file_format == "PNG":
-            plt.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
+            fig.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
             mime_type = "image/png"
             file_ext = "png"
         elif file_format == "SVG":
-            plt.savefig(buf, format="svg", bbox_inches='tight')
+            fig.savefig(buf, format="svg", dpi=dpi, bbox_inches='tight')
             mime_type = "image/svg+xml"
             file_ext = "svg"
         elif file_format == "PDF":
-            plt.savefig(buf, format="pdf", bbox_inches='tight')
+            fig.savefig(buf, format="pdf", dpi=dpi, bbox_inches='tight')
             mime_type = "application/pdf"
             file_ext = "pdf"
 
         buf.seek(0)
+
+        # Reuse the PNG export for display; vector formats get a light screen render
+        if file_format == "PNG":
+            st.image(buf.getvalue(), use_container_width=True)
+        else:
+            screen_buf = io.BytesIO()
+            fig.savefig(screen_buf, format="png", dpi=100, bbox_inches='tight')
+            st.image(screen_buf.getvalue(), use_container_width=True)
         current_date = datetime.now().strftime("%Y-%m-%d")
         #filename = f"climate_stripes_{min_year}-{max_year}_{current_date}.{file_ext}"
         #filename = f"{custom_filename}_{min_year}-{max_year}_{current_date}.{file_ext}"
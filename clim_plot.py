@@ -1,17 +1,60 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.colors as mcolors
 from matplotlib.cm import ScalarMappable
 import io
 from datetime import datetime
 
+plt.ioff()
+
 # Configure the app
 st.set_page_config(page_title="Climate Plots Generator", page_icon="🌍", layout="wide")
 st.title(":earth_africa: Plots Generator")
 st.markdown("Make climate stripes plots for any parameter (Temperature, Precipitation, etc.). Created by **Dimitris Katsanos**")
 
+@st.cache_data
+def load_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse the uploaded CSV once and reuse it across reruns"""
+    try:
+        return pd.read_csv(io.BytesIO(file_bytes), engine='pyarrow')
+    except ImportError:
+        return pd.read_csv(io.BytesIO(file_bytes), engine='c',
+                           low_memory=False, cache_dates=True)
+
+
+@st.cache_data
+def compute_anomaly(df: pd.DataFrame, col: str) -> pd.Series:
+    """Anomaly of a column relative to its mean"""
+    return df[col] - df[col].mean()
+
+
+@st.cache_resource
+def get_cmap_cached(name: str):
+    """Colormaps are shared singletons, so look each one up only once"""
+    return plt.get_cmap(name)
+
+
+def get_norm(vmin, vmax):
+    """Reuse this session's norm until the color range changes"""
+    if st.session_state.get('norm_range') != (vmin, vmax):
+        st.session_state['norm'] = mcolors.Normalize(vmin=vmin, vmax=vmax)
+        st.session_state['norm_range'] = (vmin, vmax)
+    return st.session_state['norm']
+
+
+def bin_average(values, n_bins):
+    """Average consecutive values into at most n_bins columns"""
+    if values.size <= n_bins:
+        return values
+    edges = np.linspace(0, values.size, n_bins + 1).astype(int)
+    return np.add.reduceat(values, edges[:-1]) / np.diff(edges).astype(values.dtype)
+
 # Sidebar with controls
 with st.sidebar:
     st.header("Upload Data")
@@ -67,7 +110,7 @@ st.sidebar.download_button(
 
 if uploaded_file is not None:
     try:
-        df = pd.read_csv(uploaded_file)
+        df = load_csv(uploaded_file.getvalue())
 
         if 'Year' not in df.columns:
             st.error("CSV must contain a 'Year' column")
@@ -87,8 +130,7 @@ if uploaded_file is not None:
         max_year = df['Year'].max()
 
         # Compute anomalies
-        mean_value = df[parameter].mean()
-        df['Anomaly'] = df[parameter] - mean_value
+        df['Anomaly'] = compute_anomaly(df, parameter)
 
         # Reference line value
         if reference_line == "Average":
@@ -104,16 +146,21 @@ if uploaded_file is not None:
             st.dataframe(df.head(10))
             st.caption(f"Data range: {min_year} to {max_year} ({len(df)} years)")
 
-        fig, ax = plt.subplots(figsize=(15, stripe_height * 0.5))
+        fig = Figure(figsize=(15, stripe_height * 0.5))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
 
         vmin = color_min if set_color_range else df['Anomaly'].min()
         vmax = color_max if set_color_range else df['Anomaly'].max()
-        norm = mcolors.Normalize(vmin=vmin, vmax=vmax)
-        cmap = plt.get_cmap(colormap)
+        norm = get_norm(vmin, vmax)
+        cmap = get_cmap_cached(colormap)
 
-        for i, row in df.iterrows():
-            color = cmap(norm(row['Anomaly']))
-            ax.fill_between([i, i + 1], 0, 1, color=color)
+        # Colormap all years at once and draw them as a single image
+        n_px = int(fig.get_size_inches()[0] * dpi)
+        rgba = cmap(norm(bin_average(df['Anomaly'].to_numpy(dtype=np.float32), n_px)))
+        im = ax.imshow(rgba[np.newaxis, :, :], aspect='auto',
+                       extent=[0, len(df), 0, 1], interpolation='nearest')
+        im.set_rasterized(True)
 
         if ref_value is not None:
             ref_index = np.interp(ref_value, [vmin, vmax], [0, 1])
@@ -123,16 +170,19 @@ if uploaded_file is not None:
 
         ax.set_xlim(0, len(df))
         ax.set_ylim(0, 1)
-        ax.set_axis_off()
+        ax.spines[:].set_visible(False)
+        ax.set_yticks([])
+        ax.tick_params(axis='x', length=0)
 
         if show_years:
-            years = df['Year'].unique()
-            for i, year in enumerate(years):
-                if year % year_step == 0:
-                    ax.text(i + 0.5, -0.05, str(year), 
-                            rotation=90, ha='center', va='top', fontsize=10, alpha=0.7)
+            years = df['Year'].to_numpy()
+            mask = years % year_step == 0
+            ax.set_xticks(np.nonzero(mask)[0] + 0.5)
+            ax.set_xticklabels(years[mask].astype(str), rotation=90, fontsize=10, alpha=0.7)
+        else:
+            ax.set_xticks([])
 
-        plt.title(f"{custom_title}: {parameter} ({min_year} - {max_year})", fontsize=18, pad=20)
+        ax.set_title(f"{custom_title}: {parameter} ({min_year} - {max_year})", fontsize=18, pad=20)
 
         # Colorbar
         sm = ScalarMappable(norm=norm, cmap=cmap)
@@ -140,24 +190,29 @@ if uploaded_file is not None:
         cbar.set_label(f'% Anomaly', fontsize=12)
         #cbar.set_label(f'{parameter} % Anomaly', fontsize=12)
 
-        st.pyplot(fig)
-
         # Save figure
         buf = io.BytesIO()
         if file_format == "PNG":
-            plt.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
+            fig.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
             mime_type = "image/png"
             file_ext = "png"
         elif file_format == "SVG":
-            plt.savefig(buf, format="svg", bbox_inches='tight')
+            fig.savefig(buf, format="svg", dpi=dpi, bbox_inches='tight')
             mime_type = "image/svg+xml"
             file_ext = "svg"
         elif file_format == "PDF":
-            plt.savefig(buf, format="pdf", bbox_inches='tight')
+            fig.savefig(buf, format="pdf", dpi=dpi, bbox_inches='tight')
             mime_type = "application/pdf"
             file_ext = "pdf"
 
         buf.seek(0)
+
+        if file_format == "PNG":
+            st.image(buf.getvalue(), use_container_width=True)
+        else:
+            screen_buf = io.BytesIO()
+            fig.savefig(screen_buf, format="png", dpi=100, bbox_inches='tight')
+            st.image(screen_buf.getvalue(), use_container_width=True)
         filename = f"{custom_filename}_{parameter}_{min_year}-{max_year}.{file_ext}"
 
         st.download_button(
@@ -1,68 +1,52 @@
 import streamlit as st
 from docx import Document
 import io
+import re
 import datetime
 
-def replace_placeholder(paragraph, key, value):
-    """Improved placeholder replacement preserving formatting"""
-    if key not in paragraph.text:
-        return
-    
+def replace_placeholders(paragraph, pattern, replacements):
+    """Replace all placeholders in one pass, preserving formatting"""
     # Store all runs and their text
     runs = list(paragraph.runs)
     text = ''.join(run.text for run in runs)
-    
-    if key not in text:
+
+    matches = [(m.start(), m.end(), replacements[m.group(0)])
+               for m in pattern.finditer(text)]
+    if not matches:
         return
-    
-    # Find start and end positions of the key
-    start_idx = text.find(key)
-    end_idx = start_idx + len(key)
-    
+
     # Clear paragraph and rebuild
     paragraph.clear()
     current_idx = 0
-    
+
     for run in runs:
-        run_text = run.text
-        run_end = current_idx + len(run_text)
-        
-        # Case 1: Run is entirely before the key
-        if run_end <= start_idx:
-            new_run = paragraph.add_run(run_text)
-            copy_run_formatting(new_run, run)
-        
-        # Case 2: Run contains start of key
-        elif current_idx <= start_idx < run_end:
-            # Part before key
-            if current_idx < start_idx:
-                prefix = run_text[:start_idx - current_idx]
-                new_run = paragraph.add_run(prefix)
-                copy_run_formatting(new_run, run)
-            
-            # Replacement text with original formatting
-            new_run = paragraph.add_run(value)
+        run_end = current_idx + len(run.text)
+        pieces = []
+        pos = current_idx
+
+        for start_idx, end_idx, value in matches:
+            # Skip placeholders that do not overlap this run
+            if end_idx <= current_idx or start_idx >= run_end:
+                continue
+
+            # Text of this run before the placeholder
+            if start_idx > pos:
+                pieces.append(text[pos:start_idx])
+
+            # The run holding the start of the key carries the replacement
+            if start_idx >= current_idx:
+                pieces.append(value)
+
+            pos = max(pos, min(end_idx, run_end))
+
+        # Text of this run after the last placeholder
+        if pos < run_end:
+            pieces.append(text[pos:run_end])
+
+        if pieces:
+            new_run = paragraph.add_run(''.join(pieces))
             copy_run_formatting(new_run, run)
-            
-            # Part after key (if any)
-            post_start = start_idx - current_idx + len(key)
-            if post_start < len(run_text):
-                suffix = run_text[post_start:]
-                new_run = paragraph.add_run(suffix)
-                copy_run_formatting(new_run, run)
-        
-        # Case 3: Run is within key (skip)
-        elif start_idx < current_idx < end_idx:
-            pass
-        
-        # Case 4: Run after key
-        else:
-            suffix_start = max(0, end_idx - current_idx)
-            suffix = run_text[suffix_start:]
-            if suffix:
-                new_run = paragraph.add_run(suffix)
-                copy_run_formatting(new_run, run)
-        
+
         current_idx = run_end
 
 def copy_run_formatting(new_run, original_run):
@@ -84,6 +68,12 @@ def copy_run_formatting(new_run, original_run):
         if rFonts is not None and getattr(rFonts, "eastAsia", None):
             new_run._element.rPr.rFonts = rFonts
 
+@st.cache_data
+def load_template(path):
+    """Read the template file once; each contract is parsed from memory"""
+    with open(path, "rb") as f:
+        return f.read()
+
 # --- Streamlit UI ---
 st.title("📝 Contract Generator")
 st.write(f"Created by **Dimitris Katsanos**")
@@ -108,7 +98,7 @@ with st.form("contract_form"):
     submit_button = st.form_submit_button("Generate Contract")
 
 if submit_button:
-    doc = Document("template.docx")
+    doc = Document(io.BytesIO(load_template("template.docx")))
     formatted_date = date.strftime("%d/%m/%Y")
     
     replacements = {
@@ -129,19 +119,22 @@ if submit_button:
         "{{name2}}": name2,
         "{{terms}}": terms
     }
+    pattern = re.compile('|'.join(re.escape(key) for key in replacements))
     
     # Process all paragraphs
     for paragraph in doc.paragraphs:
-        for key, value in replacements.items():
-            replace_placeholder(paragraph, key, value)
+        if '{{' not in paragraph.text:
+            continue
+        replace_placeholders(paragraph, pattern, replacements)
     
     # Process tables
     for table in doc.tables:
         for row in table.rows:
             for cell in row.cells:
                 for paragraph in cell.paragraphs:
-                    for key, value in replacements.items():
-                        replace_placeholder(paragraph, key, value)
+                    if '{{' not in paragraph.text:
+                        continue
+                    replace_placeholders(paragraph, pattern, replacements)
     
     doc_bytes = io.BytesIO()
     doc.save(doc_bytes)
@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 from matplotlib.cm import ScalarMappable
 import io
+from collections import defaultdict
 
 # -------------------------------------------------
 # PAGE CONFIG
@@ -13,6 +16,80 @@ st.set_page_config(page_title="Climate Plots", page_icon="🌍", layout="wide")
 st.title("🌍 Climate Visualisation App")
 st.markdown("Stripes • Bars • Mosaic • Seasonal")
 
+# -------------------------------------------------
+# CACHED DATA
+# -------------------------------------------------
+@st.cache_data
+def load_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse and sort the uploaded CSV once per file"""
+    # Declared dtypes skip type inference and halve memory against float64
+    dtypes = defaultdict(lambda: "float32", Year="int32")
+    try:
+        df = pd.read_csv(io.BytesIO(file_bytes), dtype=dtypes)
+    except ValueError:
+        # Text columns or missing years: fall back to inferred dtypes
+        df = pd.read_csv(io.BytesIO(file_bytes))
+    if "Year" in df.columns:
+        df = df.sort_values("Year").reset_index(drop=True)
+    return df
+
+
+@st.cache_data
+def compute_anomaly(df: pd.DataFrame, col: str) -> pd.Series:
+    """Anomaly of a column relative to its mean"""
+    # Single precision is plenty for color mapping and halves the memory traffic
+    return (df[col] - df[col].mean()).astype(np.float32)
+
+
+@st.cache_data
+def fit_trend(years: np.ndarray, anomaly: np.ndarray) -> np.ndarray:
+    """Linear trend evaluated at each year (closed-form least squares)"""
+    x = years.astype(np.float64)
+    y = anomaly.astype(np.float64)
+    dx = x - x.mean()
+    # Dot products fuse the multiply and sum without full-size temporaries
+    slope = np.dot(dx, y) / np.dot(dx, dx)
+    return y.mean() + slope * dx
+
+
+@st.cache_data
+def compute_anomaly_matrix(df: pd.DataFrame, month_cols: list) -> np.ndarray:
+    """Monthly climatology anomaly, one row per year"""
+    data_matrix = df[month_cols].to_numpy(dtype=np.float32)
+    # Plain mean is a single pass; nanmean only when values are missing
+    if np.isnan(data_matrix).any():
+        monthly_mean = np.nanmean(data_matrix, axis=0)
+    else:
+        monthly_mean = data_matrix.mean(axis=0)
+    return data_matrix - monthly_mean
+
+
+@st.cache_data
+def compute_seasonal(anomaly: np.ndarray) -> np.ndarray:
+    """Average the monthly anomalies over DJF, MAM, JJA and SON"""
+    season_idx = np.array([11,0,1, 2,3,4, 5,6,7, 8,9,10])
+    seasonal = anomaly[:, season_idx].reshape(anomaly.shape[0], 4, 3)
+    if np.isnan(seasonal).any():
+        return np.nanmean(seasonal, axis=2)
+    return seasonal.mean(axis=2)
+
+
+@st.cache_resource
+def get_lut(name: str) -> np.ndarray:
+    """256-entry uint8 RGBA lookup table for a colormap"""
+    return (plt.get_cmap(name)(np.linspace(0, 1, 256)) * 255).astype(np.uint8)
+
+
+def to_rgba(values, norm, lut):
+    """Map values through a TwoSlopeNorm to uint8 RGBA so imshow skips norm/cmap on draw"""
+    # One interpolation pass gives the table index directly (same bins as norm + cmap)
+    idx = np.interp(values, [norm.vmin, norm.vcenter, norm.vmax], [0, 128, 256])
+    np.minimum(idx, 255, out=idx)
+    rgba = lut[np.nan_to_num(idx, copy=False).astype(np.uint8)]
+    rgba[np.isnan(values)] = 0  # missing cells stay transparent
+    return rgba
+
+
 # -------------------------------------------------
 # SIDEBAR
 # -------------------------------------------------
@@ -60,15 +137,10 @@ with st.sidebar:
 # -------------------------------------------------
 # MAIN
 # -------------------------------------------------
-if uploaded_file:
-
-    df = pd.read_csv(uploaded_file)
-
-    if "Year" not in df.columns:
-        st.error("CSV must contain 'Year' column")
-        st.stop()
+@st.fragment
+def render(df):
+    """Build, show and export the plot; widgets in here rerun only this block"""
 
-    df = df.sort_values("Year").reset_index(drop=True)
     min_year, max_year = df["Year"].min(), df["Year"].max()
 
     # =================================================
@@ -76,14 +148,13 @@ if uploaded_file:
     # =================================================
     if plot_type in ["Stripes", "Bars"]:
 
-        param_columns = [col for col in df.columns if col != "Year"]
+        param_columns = [col for col in df.columns if col not in ("Year", "Anomaly")]
         parameter = st.selectbox("Select Parameter", param_columns)
 
-        mean_value = df[parameter].mean()
-        df["Anomaly"] = df[parameter] - mean_value
+        anomaly = compute_anomaly(df, parameter)
 
-        vmin = df["Anomaly"].min()
-        vmax = df["Anomaly"].max()
+        vmin = anomaly.min()
+        vmax = anomaly.max()
 
         if auto_center:
             max_abs = max(abs(vmin), abs(vmax))
@@ -99,26 +170,31 @@ if uploaded_file:
 
         if plot_type == "Stripes":
 
-            for i, row in df.iterrows():
-                ax.fill_between(
-                    [i, i+1], 0, 1,
-                    color=cmap(norm(row["Anomaly"]))
-                )
+            rgba = to_rgba(anomaly.to_numpy()[np.newaxis, :], norm, get_lut(colormap))
+            im = ax.imshow(
+                rgba, aspect="auto",
+                extent=[0, len(df), 0, 1], interpolation="nearest"
+            )
+            im.set_rasterized(True)
 
             ax.set_xlim(0, len(df))
             ax.set_ylim(0, 1)
-            ax.set_axis_off()
+            ax.spines[:].set_visible(False)
+            ax.set_yticks([])
+            ax.tick_params(axis="x", length=0)
 
             if show_years:
-                for i, year in enumerate(df["Year"]):
-                    if year % year_step == 0:
-                        ax.text(i+0.5, -0.05, str(year),
-                                rotation=90, ha='center')
+                years = df["Year"].to_numpy()
+                mask = years % year_step == 0
+                ax.set_xticks(np.nonzero(mask)[0] + 0.5)
+                ax.set_xticklabels(years[mask], rotation=90)
+            else:
+                ax.set_xticks([])
 
         elif plot_type == "Bars":
 
-            colors = cmap(norm(df["Anomaly"]))
-            ax.bar(df["Year"], df["Anomaly"], color=colors)
+            colors = cmap(norm(anomaly.to_numpy()))
+            ax.bar(df["Year"], anomaly, color=colors)
 
             if show_years:
                 ax.set_xticks(df["Year"][::year_step])
@@ -127,16 +203,14 @@ if uploaded_file:
             ax.axhline(0, color="black", linewidth=1)
 
             if add_trendline:
-                z = np.polyfit(df["Year"], df["Anomaly"], 1)
-                p = np.poly1d(z)
-                ax.plot(df["Year"], p(df["Year"]),
+                trend = fit_trend(df["Year"].to_numpy(), anomaly.to_numpy())
+                ax.plot(df["Year"], trend,
                         color="black", linewidth=2)
 
         sm = ScalarMappable(norm=norm, cmap=cmap)
         fig.colorbar(sm, ax=ax, label="Anomaly")
 
-        plt.title(f"{parameter} Anomaly ({min_year}-{max_year})")
-        st.pyplot(fig)
+        ax.set_title(f"{parameter} Anomaly ({min_year}-{max_year})")
 
 
     # =================================================
@@ -150,27 +224,13 @@ if uploaded_file:
             st.error("Need 12 monthly columns (Jan–Dec)")
             st.stop()
 
-        data_matrix = df[month_cols].values
-
         # Monthly climatology anomaly (correct approach)
-        monthly_mean = np.nanmean(data_matrix, axis=0)
-        anomaly = data_matrix - monthly_mean
+        anomaly = compute_anomaly_matrix(df, month_cols)
 
         if plot_type == "Seasonal Mosaic":
 
-            seasons = {
-                "DJF": [11,0,1],
-                "MAM": [2,3,4],
-                "JJA": [5,6,7],
-                "SON": [8,9,10]
-            }
-
-            seasonal_matrix = []
-            for s in seasons.values():
-                seasonal_matrix.append(np.nanmean(anomaly[:, s], axis=1))
-
-            anomaly = np.array(seasonal_matrix).T
-            month_cols = list(seasons.keys())
+            anomaly = compute_seasonal(anomaly)
+            month_cols = ["DJF", "MAM", "JJA", "SON"]
 
         vmin = np.nanmin(anomaly)
         vmax = np.nanmax(anomaly)
@@ -188,12 +248,12 @@ if uploaded_file:
         fig, ax = plt.subplots(figsize=(15,6))
 
         im = ax.imshow(
-            anomaly.T,
+            to_rgba(anomaly.T, norm, get_lut(colormap)),
             aspect="auto",
-            cmap=cmap,
-            norm=norm,
             origin="lower"
         )
+        # One bitmap for the whole grid in SVG/PDF instead of a quad per cell
+        im.set_rasterized(True)
 
         # Grid style (journal quality)
         ax.set_xticks(np.arange(-.5, len(df), 1), minor=True)
@@ -210,24 +270,51 @@ if uploaded_file:
         ax.set_yticks(np.arange(len(month_cols)))
         ax.set_yticklabels(month_cols)
 
-        fig.colorbar(im, ax=ax, label="Anomaly")
+        sm = ScalarMappable(norm=norm, cmap=cmap)
+        fig.colorbar(sm, ax=ax, label="Anomaly")
 
-        plt.title(f"{plot_type} ({min_year}-{max_year})")
-        st.pyplot(fig)
+        ax.set_title(f"{plot_type} ({min_year}-{max_year})")
 
 
     # =================================================
     # EXPORT
     # =================================================
     buf = io.BytesIO()
-    plt.savefig(buf, format=file_format.lower(), dpi=dpi, bbox_inches='tight')
+    if file_format == "PNG":
+        fig.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
+    else:
+        # A fixed layout skips the extra tight-bbox draw; dpi still sets the
+        # resolution of the rasterized images embedded in SVG/PDF
+        fig.tight_layout()
+        with matplotlib.rc_context({"path.simplify_threshold": 1.0}):
+            fig.savefig(buf, format=file_format.lower(), dpi=dpi, metadata={})
     buf.seek(0)
 
+    if file_format == "PNG":
+        st.image(buf.getvalue(), use_container_width=True)
+    else:
+        screen_buf = io.BytesIO()
+        fig.savefig(screen_buf, format="png", dpi=100)
+        st.image(screen_buf.getvalue(), use_container_width=True)
+    plt.close(fig)
+
     st.download_button(
         f"Download {file_format}",
         buf,
-        file_name=f"climate_plot.{file_format.lower()}"
+        file_name=f"climate_plot.{file_format.lower()}",
+        on_click="ignore"
     )
 
+
+if uploaded_file:
+
+    df = load_csv(uploaded_file.getvalue())
+
+    if "Year" not in df.columns:
+        st.error("CSV must contain 'Year' column")
+        st.stop()
+
+    render(df)
+
 else:
     st.info("Upload a CSV file to begin.")
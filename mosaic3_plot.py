@@ -1,17 +1,98 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.colors as mcolors
 from matplotlib.cm import ScalarMappable
 import io
 
+plt.ioff()
+
 # -------------------------------------------------
 # PAGE CONFIG
 # -------------------------------------------------
 st.set_page_config(page_title="Climate Plots", page_icon="🌍", layout="wide")
 st.title("🌍 Climate Visualisation App")
 st.markdown("Make climate summary plots for NOA´s Thiseio Station. Created by **Dimitris Katsanos**")
+
+# -------------------------------------------------
+# CACHED DATA
+# -------------------------------------------------
+@st.cache_data
+def load_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse the uploaded CSV once and reuse it across reruns"""
+    try:
+        return pd.read_csv(io.BytesIO(file_bytes), engine="pyarrow")
+    except ImportError:
+        return pd.read_csv(io.BytesIO(file_bytes), engine="c",
+                           low_memory=False, cache_dates=True)
+
+
+@st.cache_data
+def compute_anomaly(df: pd.DataFrame, col: str) -> pd.Series:
+    """Anomaly of a column relative to its mean"""
+    return df[col] - df[col].mean()
+
+
+@st.cache_data
+def fit_trend(years: np.ndarray, anomaly: np.ndarray) -> np.ndarray:
+    """Linear trend evaluated at each year (closed-form least squares)"""
+    x = years.astype(np.float64)
+    y = anomaly.astype(np.float64)
+    dx = x - x.mean()
+    slope = np.dot(dx, y) / np.dot(dx, dx)
+    return y.mean() + slope * dx
+
+
+@st.cache_resource
+def get_cmap_cached(name: str):
+    """Colormaps are shared singletons, so look each one up only once"""
+    return plt.get_cmap(name)
+
+
+def get_norm(vmin, vmax):
+    """Reuse this session's norm until the color range changes"""
+    if st.session_state.get("norm_range") != (vmin, vmax):
+        st.session_state["norm"] = mcolors.TwoSlopeNorm(vmin=vmin, vcenter=0, vmax=vmax)
+        st.session_state["norm_range"] = (vmin, vmax)
+    return st.session_state["norm"]
+
+
+def bin_average(values, n_bins):
+    """Average consecutive values into at most n_bins columns"""
+    if values.size <= n_bins:
+        return values
+    edges = np.linspace(0, values.size, n_bins + 1).astype(int)
+    return np.add.reduceat(values, edges[:-1]) / np.diff(edges).astype(values.dtype)
+
+
+@st.cache_data
+def compute_anomaly_matrix(df: pd.DataFrame, month_cols: list) -> np.ndarray:
+    """Monthly climatology anomaly, one row per year"""
+    data_matrix = df[month_cols].to_numpy(dtype=np.float32)
+    monthly_mean = np.nanmean(data_matrix, axis=0)
+    return data_matrix - monthly_mean
+
+
+# Month indices per season: DJF, MAM, JJA, SON
+SEASON_IDX = np.array([
+    [11,0,1],
+    [2,3,4],
+    [5,6,7],
+    [8,9,10]
+])
+
+
+@st.cache_data
+def compute_seasonal(anomaly: np.ndarray) -> np.ndarray:
+    """Average the monthly anomalies over each season"""
+    # (years, 4, 3) view reduced over the months of each season
+    return np.nanmean(anomaly[:, SEASON_IDX], axis=2)
+
 # -------------------------------------------------
 # SIDEBAR
 # -------------------------------------------------
@@ -67,7 +148,7 @@ with st.sidebar:
 # -------------------------------------------------
 if uploaded_file:
 
-    df = pd.read_csv(uploaded_file)
+    df = load_csv(uploaded_file.getvalue())
 
     if "Year" not in df.columns:
         st.error("CSV must contain 'Year' column")
@@ -84,8 +165,7 @@ if uploaded_file:
         param_columns = [col for col in df.columns if col != "Year"]
         parameter = st.selectbox("Select Parameter", param_columns)
 
-        mean_value = df[parameter].mean()
-        df["Anomaly"] = df[parameter] - mean_value
+        df["Anomaly"] = compute_anomaly(df, parameter)
 
         vmin = df["Anomaly"].min()
         vmax = df["Anomaly"].max()
@@ -97,28 +177,33 @@ if uploaded_file:
         if set_color_range:
             vmin, vmax = color_min, color_max
 
-        norm = mcolors.TwoSlopeNorm(vmin=vmin, vcenter=0, vmax=vmax)
-        cmap = plt.get_cmap(colormap)
+        norm = get_norm(vmin, vmax)
+        cmap = get_cmap_cached(colormap)
+
+        fig = Figure(figsize=(15,5))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
 
-        fig, ax = plt.subplots(figsize=(15,5))
+        arr = df["Anomaly"].to_numpy(dtype=np.float32)
 
         if plot_type == "Stripes":
 
-            for i, row in df.iterrows():
-                ax.fill_between([i, i+1], 0, 1,
-                                color=cmap(norm(row["Anomaly"])))
+            n_px = int(fig.get_size_inches()[0] * dpi)
+            rgba = cmap(norm(bin_average(arr, n_px)))
+            im = ax.imshow(rgba[np.newaxis, :, :], aspect="auto",
+                           extent=[0, len(df), 0, 1], interpolation="nearest")
+            im.set_rasterized(True)
 
             ax.set_axis_off()
 
         elif plot_type == "Bars":
 
-            colors = cmap(norm(df["Anomaly"]))
-            ax.bar(df["Year"], df["Anomaly"], color=colors)
+            rgba = cmap(norm(arr))
+            ax.bar(df["Year"].to_numpy(), arr, color=rgba)
 
             if add_trendline:
-                z = np.polyfit(df["Year"], df["Anomaly"], 1)
-                p = np.poly1d(z)
-                ax.plot(df["Year"], p(df["Year"]),
+                trend = fit_trend(df["Year"].to_numpy(), arr)
+                ax.plot(df["Year"].to_numpy(), trend,
                         color="black", linewidth=2)
 
             ax.axhline(0, color="black", linewidth=1)
@@ -126,7 +211,7 @@ if uploaded_file:
         sm = ScalarMappable(norm=norm, cmap=cmap)
         fig.colorbar(sm, ax=ax, label="Anomaly")
 
-        plt.title(f"{custom_title} ({min_year}-{max_year})")
+        ax.set_title(f"{custom_title} ({min_year}-{max_year})")
         st.pyplot(fig)
 
 
@@ -141,27 +226,13 @@ if uploaded_file:
             st.error("Need 12 monthly columns (Jan–Dec)")
             st.stop()
 
-        data_matrix = df[month_cols].values
-
         # Monthly climatology anomaly
-        monthly_mean = np.nanmean(data_matrix, axis=0)
-        anomaly = data_matrix - monthly_mean
+        anomaly = compute_anomaly_matrix(df, month_cols)
 
         if plot_type == "Seasonal Mosaic":
 
-            seasons = {
-                "DJF": [11,0,1],
-                "MAM": [2,3,4],
-                "JJA": [5,6,7],
-                "SON": [8,9,10]
-            }
-
-            seasonal_matrix = []
-            for s in seasons.values():
-                seasonal_matrix.append(np.nanmean(anomaly[:, s], axis=1))
-
-            anomaly = np.array(seasonal_matrix).T
-            month_cols = list(seasons.keys())
+            anomaly = compute_seasonal(anomaly)
+            month_cols = ["DJF", "MAM", "JJA", "SON"]
 
         # Month order control
         if month_position == "January":
@@ -181,14 +252,16 @@ if uploaded_file:
         if set_color_range:
             vmin, vmax = color_min, color_max
 
-        norm = mcolors.TwoSlopeNorm(vmin=vmin, vcenter=0, vmax=vmax)
-        cmap = plt.get_cmap(colormap)
+        norm = get_norm(vmin, vmax)
+        cmap = get_cmap_cached(colormap)
 
         n_years = len(df)
         fig_width = max(12, n_years * 0.35)
         fig_height = 8
 
-        fig, ax = plt.subplots(figsize=(fig_width, fig_height))
+        fig = Figure(figsize=(fig_width, fig_height))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
 
         im = ax.imshow(
             anomaly.T,
@@ -197,6 +270,7 @@ if uploaded_file:
             origin=origin_setting,
             aspect="auto"
         )
+        im.set_rasterized(True)
 
         # Grid
         ax.set_xticks(np.arange(-.5, n_years, 1), minor=True)
@@ -224,7 +298,7 @@ if uploaded_file:
         cbar.set_label("Anomaly", fontsize=14)
         cbar.ax.tick_params(labelsize=12)
 
-        plt.title(f"{custom_title} ({min_year}-{max_year})", fontsize=24)
+        ax.set_title(f"{custom_title} ({min_year}-{max_year})", fontsize=24)
 
         st.pyplot(fig)
 
@@ -233,7 +307,7 @@ if uploaded_file:
     # EXPORT
     # =================================================
     buf = io.BytesIO()
-    plt.savefig(buf, format=file_format.lower(), dpi=dpi, bbox_inches='tight')
+    fig.savefig(buf, format=file_format.lower(), dpi=dpi, bbox_inches='tight')
     buf.seek(0)
 
     st.download_button(
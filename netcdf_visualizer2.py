@@ -1,48 +1,19 @@
 import streamlit as st
 import xarray as xr
 import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
 from matplotlib import colors
-import os
-import time
-import gc
-import pandas as pd
-import tempfile
-import shutil
+import io
+import hashlib
+from functools import lru_cache
 
 # Configure the app
 st.set_page_config(layout="wide")
 st.title("NetCDF Data Visualization Tool")
 st.write(f"Created by **Dimitris Katsanos**")
-# Create a dedicated temp directory
-TEMP_DIR = "netcdf_temp_files"
-os.makedirs(TEMP_DIR, exist_ok=True)
-
-def cleanup_temp_dir():
-    """Clean up temp directory by removing files older than 1 hour"""
-    now = time.time()
-    for filename in os.listdir(TEMP_DIR):
-        filepath = os.path.join(TEMP_DIR, filename)
-        if os.path.isfile(filepath):
-            file_age = now - os.path.getmtime(filepath)
-            if file_age > 3600:  # 1 hour
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
-
-def safe_remove(filepath):
-    """Safely remove a file with multiple retries"""
-    for i in range(5):
-        try:
-            os.remove(filepath)
-            return True
-        except PermissionError:
-            time.sleep(0.5 * (i + 1))
-            gc.collect()
-    return False
 
 def is_numeric(data):
     """Check if data is numeric"""
@@ -56,10 +27,12 @@ def is_time_related(var_name):
 def process_data(data_array, scale_factor=40.0):
     """Process data with type checking and conversion"""
     if is_numeric(data_array):
-        return data_array.values * scale_factor
+        # Single precision is enough for display and halves the memory traffic
+        return data_array.values.astype(np.float32) * np.float32(scale_factor)
     elif np.issubdtype(data_array.dtype, np.datetime64):
         st.warning("Datetime data detected - converting to ordinal numbers")
-        return np.array([pd.Timestamp(t).toordinal() for t in data_array.values])
+        # Days since the epoch plus the ordinal of 1970-01-01
+        return data_array.values.astype('datetime64[D]').view('int64') + 719163
     else:
         raise ValueError(f"Unsupported data type: {data_array.dtype}")
 
@@ -77,6 +50,28 @@ def reduce_to_2d(data_array):
     # Reduce dimensions
     return data_array.isel(**dim_indices) if dim_indices else data_array
 
+def coord_slice(coord, lo, hi):
+    """Slice selecting [lo, hi] on an ascending or descending 1D coordinate"""
+    if coord.size > 1 and coord[0] > coord[-1]:
+        return slice(hi, lo)
+    return slice(lo, hi)
+
+@lru_cache(maxsize=None)
+def load_cartopy():
+    """Import cartopy on first use only; sessions without a file never pay for it"""
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+    return ccrs, cfeature
+
+@st.cache_data
+def summarize_dataset(file_key, _data):
+    """One row per variable, built once per uploaded file"""
+    return pd.DataFrame([
+        {'name': var, 'dtype': str(_data[var].dtype),
+         'dims': ', '.join(_data[var].dims), 'shape': str(_data[var].shape)}
+        for var in _data.data_vars
+    ])
+
 # Sidebar controls
 with st.sidebar:
     st.header("Visualization Settings")
@@ -119,126 +114,38 @@ with st.sidebar:
     scale_factor = st.number_input("Scale factor", value=40.0, step=1.0)
     output_name = st.text_input("Output filename (without extension)", "output_plot")
     dpi = st.slider("Image DPI", 100, 600, 300)
-    
-    # Temp file cleanup button
-    if st.button("Cleanup Temporary Files"):
-        cleanup_temp_dir()
-        st.success("Temporary files cleaned up!")
 
-# Display temp file info
-temp_files = [f for f in os.listdir(TEMP_DIR) if f.endswith('.nc')]
-st.sidebar.info(f"Temporary files: {len(temp_files)}")
-if temp_files:
-    with st.sidebar.expander("View Temp Files"):
-        for file in temp_files[:10]:  # Show first 10
-            st.write(file)
-        if len(temp_files) > 10:
-            st.write(f"...and {len(temp_files)-10} more")
-
-# Main visualization
-if uploaded_file is not None:
-    # Clean up old temp files first
-    cleanup_temp_dir()
-    
-    # Create temp file in our dedicated directory
-    temp_path = os.path.join(TEMP_DIR, f"temp_upload_{int(time.time())}.nc")
-    
+@st.fragment
+def plot_map(subset, main_var, pvalue_var, lat_var, lon_var):
+    """Draw the selected variable; the save button reruns only this block"""
     try:
-        # Save uploaded file
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
-        
-        # Open with multiple engine attempts
-        engines = ['netcdf4', 'h5netcdf', 'scipy']
-        data = None
-        for engine in engines:
-            try:
-                data = xr.open_dataset(temp_path, engine=engine)
-                break
-            except Exception as e:
-                st.warning(f"{engine} engine failed: {str(e)}")
-                continue
-        
-        if data is None:
-            st.error("Failed to open file with all available engines")
-            st.stop()
+        # Process main data
+        main_data = reduce_to_2d(subset[main_var])
+        processed_data = process_data(main_data, scale_factor)
         
-        # Show dataset structure
-        with st.expander("Dataset Structure"):
-            st.write("**Variables:**", list(data.data_vars))
-            st.write("**Dimensions:**", dict(data.dims))
-            st.write("**Coordinates:**", list(data.coords))
-            st.write("**Data types:**")
-            for var in data.data_vars:
-                st.write(f"- {var}: {data[var].dtype}")
-        
-        # Detect coordinate variables
-        lat_var = next((v for v in ['latitude', 'lat', 'y'] if v in data.coords), None)
-        lon_var = next((v for v in ['longitude', 'lon', 'x'] if v in data.coords), None)
+        # Process coordinates
+        lat = subset[lat_var].values
+        lon = subset[lon_var].values
         
-        if not lat_var or not lon_var:
-            st.error("Could not find latitude/longitude coordinates")
-            st.stop()
+        # Handle different coordinate dimensions
+        if lat.ndim == 1 and lon.ndim == 1:
+            # pcolormesh takes 1D coordinates directly, no meshgrid needed
+            grid_shape = (lat.size, lon.size)
+        else:
+            # Broadcast a 1D coordinate against 2D data as a read-only view
+            if lat.ndim == 1 and processed_data.ndim == 2:
+                lat = np.broadcast_to(lat[:, np.newaxis], processed_data.shape)
+            if lon.ndim == 1 and processed_data.ndim == 2:
+                lon = np.broadcast_to(lon[np.newaxis, :], processed_data.shape)
+            grid_shape = lat.shape
         
-        # Subset data
-        subset = data.where(
-            (data[lat_var] >= lat_min) & (data[lat_var] <= lat_max) &
-            (data[lon_var] >= lon_min) & (data[lon_var] <= lon_max),
-            drop=True
+        # Create plot
+        ccrs, cfeature = load_cartopy()
+        fig, ax = plt.subplots(
+            subplot_kw={'projection': ccrs.PlateCarree()}, 
+            figsize=(12, 8)
         )
-        
-        # Prepare variable lists excluding time-related variables
-        spatial_vars = []
-        all_vars = list(data.data_vars)
-        
-        for var in all_vars:
-            # Skip time-related variables by name or type
-            if is_time_related(var) or np.issubdtype(data[var].dtype, np.datetime64):
-                continue
-            
-            # Skip 1D variables (likely coordinates)
-            if data[var].ndim < 2:
-                continue
-                
-            spatial_vars.append(var)
-        
-        # Ensure we have at least one spatial variable
-        if not spatial_vars:
-            st.error("No spatial variables found. Showing all variables as fallback.")
-            spatial_vars = all_vars
-        
-        # Variable selection
-        main_var = st.selectbox("Select main variable", spatial_vars)
-        pvalue_options = ["None"] + spatial_vars
-        pvalue_var = st.selectbox("Select p-value variable", pvalue_options)
-        
         try:
-            # Process main data
-            main_data = reduce_to_2d(subset[main_var])
-            processed_data = process_data(main_data, scale_factor)
-            
-            # Process coordinates
-            lat = subset[lat_var].values
-            lon = subset[lon_var].values
-            
-            # Handle different coordinate dimensions
-            if lat.ndim == 1 and lon.ndim == 1:
-                lon, lat = np.meshgrid(lon, lat)
-            elif lat.ndim == 2 and lon.ndim == 2:
-                pass  # Already 2D
-            else:
-                # Try to broadcast to 2D
-                if lat.ndim == 1 and processed_data.ndim == 2:
-                    lat = np.tile(lat[:, np.newaxis], (1, processed_data.shape[1]))
-                if lon.ndim == 1 and processed_data.ndim == 2:
-                    lon = np.tile(lon[np.newaxis, :], (processed_data.shape[0], 1))
-            
-            # Create plot
-            fig, ax = plt.subplots(
-                subplot_kw={'projection': ccrs.PlateCarree()}, 
-                figsize=(12, 8)
-            )
-            
             # Add map features
             ax.add_feature(cfeature.COASTLINE.with_scale('10m'), linewidth=0.5)
             ax.add_feature(cfeature.BORDERS.with_scale('10m'), linestyle='dashed')
@@ -252,16 +159,17 @@ if uploaded_file is not None:
             
             # Handle different data dimensions
             try:
-                if processed_data.shape == lat.shape:
+                if processed_data.shape == grid_shape:
                     mesh = ax.pcolormesh(lon, lat, processed_data, 
                                        cmap=color_map, norm=norm,
-                                       shading='auto')
+                                       shading='auto', rasterized=True)
                 else:
                     # Fallback to contourf if dimensions don't match
                     st.warning("Using contourf instead of pcolormesh due to dimension mismatch")
                     mesh = ax.contourf(lon, lat, processed_data, 
                                      levels=levels, cmap=color_map,
-                                     norm=norm, extend='both')
+                                     norm=norm, extend='both',
+                                     rasterized=True)
             except Exception as e:
                 st.error(f"Plotting failed: {str(e)}")
                 st.stop()
@@ -277,8 +185,13 @@ if uploaded_file is not None:
                         pdata_2d = None
                     
                     if pdata_2d is not None and pdata_2d.shape == processed_data.shape:
-                        mask = pdata_2d < p_threshold
-                        ax.scatter(lon[mask], lat[mask],
+                        # Only the significant cells' indices, then their coordinates
+                        rows, cols = np.nonzero(pdata_2d < p_threshold)
+                        if lat.ndim == 1:
+                            sig_lon, sig_lat = lon[cols], lat[rows]
+                        else:
+                            sig_lon, sig_lat = lon[rows, cols], lat[rows, cols]
+                        ax.scatter(sig_lon, sig_lat,
                                  color=marker_color,
                                  marker=marker_style,
                                  s=marker_size,
@@ -290,7 +203,7 @@ if uploaded_file is not None:
                     st.error(f"Error processing p-value data: {str(e)}")
             
             # Add colorbar and title
-            plt.colorbar(mesh, ax=ax, orientation='vertical')
+            fig.colorbar(mesh, ax=ax, orientation='vertical')
             ax.set_title(plot_title, fontsize=14)
             
             # Show plot
@@ -307,49 +220,120 @@ if uploaded_file is not None:
                         file_name=save_path,
                         mime="image/png"
                     )
+        finally:
+            # Drop the figure from pyplot's registry even if drawing or saving fails
+            plt.close(fig)
+    
+    except Exception as e:
+        st.error(f"Plotting error: {str(e)}")
+        st.error(f"Main data type: {subset[main_var].dtype if main_var in subset else 'N/A'}")
+        st.error(f"Main data shape: {processed_data.shape if 'processed_data' in locals() else 'N/A'}")
+        st.error(f"Lat shape: {lat.shape if 'lat' in locals() else 'N/A'}")
+        st.error(f"Lon shape: {lon.shape if 'lon' in locals() else 'N/A'}")
+
+
+@st.fragment
+def select_variables(data, lat_var, lon_var, file_key):
+    """Subset the region and pick variables without reopening the file"""
+    # Reuse the subset until the file or the region changes
+    subset_key = (file_key, lat_min, lat_max, lon_min, lon_max)
+    if st.session_state.get('nc_subset_key') != subset_key:
+        # Subset data: index slices on 1D coordinates, masking only for curvilinear grids
+        if data[lat_var].ndim == 1 and data[lon_var].ndim == 1:
+            subset = data.sel({
+                lat_var: coord_slice(data[lat_var].values, lat_min, lat_max),
+                lon_var: coord_slice(data[lon_var].values, lon_min, lon_max)
+            })
+        else:
+            inside = (
+                (data[lat_var] >= lat_min) & (data[lat_var] <= lat_max) &
+                (data[lon_var] >= lon_min) & (data[lon_var] <= lon_max)
+            )
+            # Index the bounding box first so only that window is read,
+            # then mask the cells outside the region
+            box = {}
+            for dim in inside.dims:
+                hits = np.flatnonzero(inside.any([d for d in inside.dims if d != dim]).values)
+                box[dim] = slice(hits[0], hits[-1] + 1) if hits.size else slice(0, 0)
+            subset = data.isel(box).where(inside.isel(box))
+        st.session_state['nc_subset'] = subset
+        st.session_state['nc_subset_key'] = subset_key
+    subset = st.session_state['nc_subset']
+    
+    # Prepare variable lists excluding time-related variables
+    spatial_vars = []
+    all_vars = list(data.data_vars)
+    
+    for var in all_vars:
+        # Skip time-related variables by name or type
+        if is_time_related(var) or np.issubdtype(data[var].dtype, np.datetime64):
+            continue
         
-        except Exception as e:
-            st.error(f"Plotting error: {str(e)}")
-            st.error(f"Main data type: {subset[main_var].dtype if main_var in subset else 'N/A'}")
-            st.error(f"Main data shape: {processed_data.shape if 'processed_data' in locals() else 'N/A'}")
-            st.error(f"Lat shape: {lat.shape if 'lat' in locals() else 'N/A'}")
-            st.error(f"Lon shape: {lon.shape if 'lon' in locals() else 'N/A'}")
+        # Skip 1D variables (likely coordinates)
+        if data[var].ndim < 2:
+            continue
+            
+        spatial_vars.append(var)
+    
+    # Ensure we have at least one spatial variable
+    if not spatial_vars:
+        st.error("No spatial variables found. Showing all variables as fallback.")
+        spatial_vars = all_vars
+    
+    # Variable selection
+    main_var = st.selectbox("Select main variable", spatial_vars)
+    pvalue_options = ["None"] + spatial_vars
+    pvalue_var = st.selectbox("Select p-value variable", pvalue_options)
+    
+    plot_map(subset, main_var, pvalue_var, lat_var, lon_var)
+
+
+# Main visualization
+if uploaded_file is not None:
+    try:
+        # Open straight from the uploaded bytes (NetCDF4/HDF5, then NetCDF3)
+        # Keep the opened dataset for this session until another file is uploaded
+        file_bytes = uploaded_file.getvalue()
+        file_key = hashlib.md5(file_bytes).hexdigest()
+        if st.session_state.get('nc_key') != file_key:
+            engines = ['h5netcdf', 'scipy']
+            data = None
+            for engine in engines:
+                try:
+                    data = xr.open_dataset(io.BytesIO(file_bytes), engine=engine)
+                    break
+                except Exception as e:
+                    st.warning(f"{engine} engine failed: {str(e)}")
+                    continue
+            
+            if data is None:
+                st.error("Failed to open file with all available engines")
+                st.stop()
+            
+            if 'nc_data' in st.session_state:
+                st.session_state['nc_data'].close()
+            st.session_state['nc_data'] = data
+            st.session_state['nc_key'] = file_key
+        data = st.session_state['nc_data']
+        
+        # Show dataset structure
+        with st.expander("Dataset Structure"):
+            st.dataframe(summarize_dataset(file_key, data), use_container_width=True)
+            st.write("**Dimensions:**", dict(data.sizes))
+            st.write("**Coordinates:**", list(data.coords))
+        
+        # Detect coordinate variables
+        lat_var = next((v for v in ['latitude', 'lat', 'y'] if v in data.coords), None)
+        lon_var = next((v for v in ['longitude', 'lon', 'x'] if v in data.coords), None)
+        
+        if not lat_var or not lon_var:
+            st.error("Could not find latitude/longitude coordinates")
+            st.stop()
     
     except Exception as e:
         st.error(f"File error: {str(e)}")
-    finally:
-        # Try to remove temp file, but don't worry if we can't
-        try:
-            if os.path.exists(temp_path):
-                # Delay removal to avoid immediate lock issues
-                time.sleep(2)
-                safe_remove(temp_path)
-        except:
-            pass
+        st.stop()
+    
+    select_variables(data, lat_var, lon_var, file_key)
 else:
     st.info("Please upload a NetCDF file")
-
-# Cleanup instructions
-with st.expander("Temporary File Management"):
-    st.markdown("""
-    **Managing Temporary Files:**
-    
-    The app creates temporary NetCDF files in the `netcdf_temp_files` directory.
-    These should be automatically deleted, but if they accumulate:
-    
-    1. **Manual Cleanup**:
-       ```python
-       import shutil
-       shutil.rmtree('netcdf_temp_files')
-       ```
-       
-    2. **Automatic Cleanup**:
-       - Files older than 1 hour are automatically removed
-       - Click "Cleanup Temporary Files" in the sidebar
-       
-    3. **Preventing Buildup**:
-       - The app cleans up before each new file upload
-       - Uses a dedicated directory for easier management
-       
-    **Location:** `./netcdf_temp_files/`
-    """)
\ No newline at end of file
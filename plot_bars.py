@@ -11,6 +11,15 @@ st.set_page_config(page_title="Climate Plots Generator", page_icon="🌍", layou
 st.title(":earth_africa: Climate Plots Generator")
 st.markdown("Make **climate stripes** or **climate bars** plots for any parameter. Created by **Dimitris Katsanos**")
 
+@st.cache_data
+def fit_trend(years: np.ndarray, anomaly: np.ndarray) -> np.ndarray:
+    """Linear trend evaluated at each year (closed-form least squares)"""
+    x = years.astype(np.float64)
+    y = anomaly.astype(np.float64)
+    dx = x - x.mean()
+    slope = np.dot(dx, y) / np.dot(dx, dx)
+    return y.mean() + slope * dx
+
 # Sidebar with controls
 with st.sidebar:
     st.header("Upload Data")
@@ -95,22 +104,22 @@ if uploaded_file is not None:
         fig, ax = plt.subplots(figsize=(15, 5))
 
         if plot_type == "Stripes":
-            for i, row in df.iterrows():
-                color = cmap(norm(row['Anomaly']))
-                ax.fill_between([i, i + 1], 0, 1, color=color)
+            values = df['Anomaly'].to_numpy()[np.newaxis, :]
+            ax.imshow(values, aspect='auto', cmap=cmap, norm=norm,
+                      extent=(0, len(df), 0, 1), interpolation='nearest')
 
             ax.set_xlim(0, len(df))
             ax.set_ylim(0, 1)
             ax.set_axis_off()
 
             if show_years:
-                for i, year in enumerate(df['Year']):
+                for i, year in enumerate(df['Year'].to_numpy()):
                     if year % year_step == 0:
                         ax.text(i + 0.5, -0.05, str(year),
                                 rotation=90, ha='center', va='top', fontsize=10, alpha=0.7)
 
         elif plot_type == "Bars":
-            colors = [cmap(norm(val)) for val in df['Anomaly']]
+            colors = cmap(norm(df['Anomaly'].to_numpy()))
             ax.bar(df['Year'], df['Anomaly'], color=colors, width=bar_width, edgecolor="black")
 
             if show_years:
@@ -118,9 +127,8 @@ if uploaded_file is not None:
                 ax.set_xticklabels(df['Year'][::year_step], rotation=90)
 
             if add_trendline:
-                z = np.polyfit(df['Year'], df['Anomaly'], 1)
-                p = np.poly1d(z)
-                ax.plot(df['Year'], p(df['Year']),
+                trend = fit_trend(df['Year'].to_numpy(), df['Anomaly'].to_numpy())
+                ax.plot(df['Year'], trend,
                         color=trend_color, linestyle=trend_style, linewidth=trend_width)
 
            # ax.set_ylabel("Anomaly")
@@ -1,16 +1,50 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.colors as mcolors
 from matplotlib.cm import ScalarMappable
+from matplotlib.collections import LineCollection
 import io
+from collections import defaultdict
 
 # Configure the app
 st.set_page_config(page_title="Climate Plots Generator", page_icon="🌍", layout="wide")
 st.title(":earth_africa: Climate Plots Generator")
 st.markdown("Make **climate stripes** or **climate bars** plots for any parameter. Created by **Dimitris Katsanos**")
 
+@st.cache_data
+def load_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse and sort the uploaded CSV once per file"""
+    dtypes = defaultdict(lambda: 'float32', Year='int32')
+    try:
+        df = pd.read_csv(io.BytesIO(file_bytes), dtype=dtypes)
+    except ValueError:
+        df = pd.read_csv(io.BytesIO(file_bytes))
+    if 'Year' in df.columns:
+        df = df.sort_values('Year').reset_index(drop=True)
+    return df
+
+
+@st.cache_data
+def compute_anomaly(df: pd.DataFrame, col: str) -> pd.Series:
+    """Anomaly of a column relative to its mean"""
+    return (df[col] - df[col].mean()).astype(np.float32)
+
+
+@st.cache_data
+def fit_trend(years: np.ndarray, anomaly: np.ndarray) -> np.ndarray:
+    """Linear trend evaluated at each year (closed-form least squares)"""
+    x = years.astype(np.float64)
+    y = anomaly.astype(np.float64)
+    dx = x - x.mean()
+    slope = np.dot(dx, y) / np.dot(dx, dx)
+    return y.mean() + slope * dx
+
 # Sidebar with controls
 with st.sidebar:
     st.header("Upload Data")
@@ -52,103 +86,129 @@ with st.sidebar:
     file_format = st.selectbox("File Format", ["PNG", "SVG", "PDF"], index=0)
 
 # Example data for download
-example_data = pd.DataFrame({
-    'Year': range(1980, 2024),
-    'Temperature': np.random.normal(15, 2, 44),
-    'Precipitation': np.random.normal(100, 20, 44),
-    'Humidity': np.random.normal(70, 5, 44)
-})
-csv = example_data.to_csv(index=False).encode('utf-8')
+@st.cache_data
+def example_csv_bytes() -> bytes:
+    """Build the example CSV once instead of on every rerun"""
+    rng = np.random.default_rng(0)
+    example_data = pd.DataFrame({
+        'Year': range(1980, 2024),
+        'Temperature': rng.normal(15, 2, 44),
+        'Precipitation': rng.normal(100, 20, 44),
+        'Humidity': rng.normal(70, 5, 44)
+    })
+    return example_data.to_csv(index=False).encode('utf-8')
+
 st.sidebar.download_button(
     label="Download Example CSV",
-    data=csv,
+    data=example_csv_bytes(),
     file_name="climate_data_example.csv",
     mime="text/csv"
 )
 
-if uploaded_file is not None:
+@st.fragment
+def render(df):
+    """Plot and export one parameter; changing it reruns only this block"""
     try:
-        df = pd.read_csv(uploaded_file)
-
-        if 'Year' not in df.columns:
-            st.error("CSV must contain a 'Year' column")
-            st.stop()
-
-        param_columns = [col for col in df.columns if col != 'Year']
+        param_columns = [col for col in df.columns if col not in ('Year', 'Anomaly')]
         if len(param_columns) < 1:
             st.error("CSV must contain at least one parameter column besides 'Year'")
             st.stop()
 
         parameter = st.selectbox("Select parameter to plot", param_columns)
 
-        df = df.sort_values('Year').reset_index(drop=True)
         min_year, max_year = df['Year'].min(), df['Year'].max()
 
-        mean_value = df[parameter].mean()
-        df['Anomaly'] = df[parameter] - mean_value
+        # Kept local: the fragment reruns with the same df object
+        anomaly = compute_anomaly(df, parameter)
 
         # 🔹 Handle color limits
         if set_color_range:
             vmin, vmax = color_min, color_max
         else:
             if plot_type == "Bars":
-                max_abs = max(abs(df['Anomaly'].min()), abs(df['Anomaly'].max()))
+                max_abs = max(abs(anomaly.min()), abs(anomaly.max()))
                 vmin, vmax = -max_abs, max_abs
             else:
-                vmin = df['Anomaly'].min()
-                vmax = df['Anomaly'].max()
+                vmin = anomaly.min()
+                vmax = anomaly.max()
 
         norm = mcolors.Normalize(vmin=vmin, vmax=vmax)
         cmap = plt.get_cmap(colormap)
 
-        fig, ax = plt.subplots(figsize=(15, 5))
+        fig = Figure(figsize=(15, 5))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
 
         if plot_type == "Stripes":
-            for i, row in df.iterrows():
-                color = cmap(norm(row['Anomaly']))
-                ax.fill_between([i, i + 1], 0, 1, color=color)
+            values = anomaly.to_numpy()[np.newaxis, :]
+            ax.imshow(values, aspect='auto', cmap=cmap, norm=norm,
+                      extent=(0, len(df), 0, 1), interpolation='nearest')
 
             ax.set_xlim(0, len(df))
             ax.set_ylim(0, 1)
-            ax.set_axis_off()
+            ax.spines[:].set_visible(False)
+            ax.set_yticks([])
+            ax.tick_params(axis='x', length=0)
 
             if show_years:
-                for i, year in enumerate(df['Year']):
-                    if year % year_step == 0:
-                        ax.text(i + 0.5, -0.05, str(year),
-                                rotation=90, ha='center', va='top', fontsize=10, alpha=0.7)
+                years = df['Year'].to_numpy()
+                mask = years % year_step == 0
+                ax.set_xticks(np.nonzero(mask)[0] + 0.5)
+                ax.set_xticklabels(years[mask], rotation=90, fontsize=10, alpha=0.7)
+            else:
+                ax.set_xticks([])
 
         elif plot_type == "Bars":
-            colors = [cmap(norm(val)) for val in df['Anomaly']]
-            ax.bar(df['Year'], df['Anomaly'], color=colors, width=bar_width, edgecolor="black")
+            colors = cmap(norm(anomaly.to_numpy()))
+            ax.bar(df['Year'], anomaly, color=colors, width=bar_width, edgecolor="black")
 
             # 🔹 Make y-axis follow vmin/vmax
             ax.set_ylim(vmin, vmax)
-            ax.axhline(0, color="black", linewidth=1)
 
             if show_years:
                 ax.set_xticks(df['Year'][::year_step])
                 ax.set_xticklabels(df['Year'][::year_step], rotation=90)
 
+            # Zero line and trendline drawn as one LineCollection across the bar limits
+            x0, x1 = ax.get_xlim()
+            segments = [[(x0, 0), (x1, 0)]]
+            line_colors, line_widths, line_styles = ["black"], [1], ["solid"]
             if add_trendline:
-                z = np.polyfit(df['Year'], df['Anomaly'], 1)
-                p = np.poly1d(z)
-                ax.plot(df['Year'], p(df['Year']),
-                        color=trend_color, linestyle=trend_style, linewidth=trend_width)
-
-        plt.title(f"{custom_title} {parameter} ({min_year}-{max_year})", fontsize=16)
+                years = df['Year'].to_numpy()
+                trend = fit_trend(years, anomaly.to_numpy())
+                segments.append(np.column_stack([years, trend]))
+                line_colors.append(trend_color)
+                line_widths.append(trend_width)
+                line_styles.append(trend_style)
+            ax.add_collection(LineCollection(segments, colors=line_colors,
+                                             linewidths=line_widths, linestyles=line_styles),
+                              autolim=False)
+            ax.set_xlim(x0, x1)
+
+        ax.set_title(f"{custom_title} {parameter} ({min_year}-{max_year})", fontsize=16)
 
         # Colorbar
         sm = ScalarMappable(norm=norm, cmap=cmap)
         cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.03, pad=0.02)
         cbar.set_label("Anomaly", fontsize=12)
 
-        st.pyplot(fig)
-
         # Save
         buf = io.BytesIO()
-        plt.savefig(buf, format=file_format.lower(), dpi=dpi, bbox_inches='tight')
+        if file_format == "PNG":
+            fig.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
+        else:
+            # A fixed layout avoids the extra draw that bbox_inches='tight' needs
+            fig.tight_layout()
+            with matplotlib.rc_context({'path.simplify_threshold': 1.0}):
+                fig.savefig(buf, format=file_format.lower(), dpi=dpi, metadata={})
         buf.seek(0)
+
+        if file_format == "PNG":
+            st.image(buf.getvalue(), use_container_width=True)
+        else:
+            screen_buf = io.BytesIO()
+            fig.savefig(screen_buf, format="png", dpi=100)
+            st.image(screen_buf.getvalue(), use_container_width=True)
         #filename = f"{custom_filename}_{parameter}_{min_year}-{max_year}.{file_format.lower()}"
         filename = f"{custom_filename}_{parameter}.{file_format.lower()}"
         
@@ -157,11 +217,26 @@ if uploaded_file is not None:
             data=buf,
             file_name=filename,
             mime="image/png" if file_format == "PNG" else
-                 "image/svg+xml" if file_format == "SVG" else "application/pdf"
+                 "image/svg+xml" if file_format == "SVG" else "application/pdf",
+            on_click="ignore"
         )
 
     except Exception as e:
         st.error(f"Error processing file: {str(e)}")
+
+
+if uploaded_file is not None:
+    try:
+        df = load_csv(uploaded_file.getvalue())
+    except Exception as e:
+        st.error(f"Error processing file: {str(e)}")
+        st.stop()
+
+    if 'Year' not in df.columns:
+        st.error("CSV must contain a 'Year' column")
+        st.stop()
+
+    render(df)
 else:
     st.markdown("""
     ## How to Use This App
@@ -118,21 +118,13 @@ if uploaded_file:
     # -------------------------------------------------
     if plot_type == "Seasonal Mosaic":
 
-        seasons = {
-            "DJF": [11, 0, 1],
-            "MAM": [2, 3, 4],
-            "JJA": [5, 6, 7],
-            "SON": [8, 9, 10]
-        }
-
-        seasonal_matrix = []
-        for s in seasons.values():
-            seasonal_matrix.append(
-                np.nanmean(anomaly[:, s], axis=1)
-            )
-
-        anomaly = np.array(seasonal_matrix).T
-        month_cols = list(seasons.keys())
+        # DJF, MAM, JJA, SON month indices, reduced in one pass
+        season_idx = np.array([11, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+        anomaly = np.nanmean(
+            anomaly[:, season_idx].reshape(anomaly.shape[0], 4, 3),
+            axis=2
+        )
+        month_cols = ["DJF", "MAM", "JJA", "SON"]
 
     # -------------------------------------------------
     # COLOR SCALING
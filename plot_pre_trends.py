@@ -1,17 +1,34 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.colors as mcolors
 from matplotlib.cm import ScalarMappable
 import io
 from datetime import datetime
+from collections import defaultdict
 
 # Configure the app
 st.set_page_config(page_title="Plots for Precipitation Trends", page_icon="🌍", layout="wide")
 st.title(":earth_africa: Precipitation Trends")
 st.markdown("Make climate stripes from precipitation data. Created by **Dimitris Katsanos**")
 
+@st.cache_data
+def load_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse and sort the uploaded CSV once per file"""
+    dtypes = defaultdict(lambda: 'float32', Year='int32')
+    try:
+        df = pd.read_csv(io.BytesIO(file_bytes), dtype=dtypes)
+    except ValueError:
+        df = pd.read_csv(io.BytesIO(file_bytes))
+    if 'Year' in df.columns:
+        df = df.sort_values('Year').reset_index(drop=True)
+    return df
+
 # Sidebar with controls
 with st.sidebar:
     st.header("Upload Data")
@@ -45,23 +62,27 @@ with st.sidebar:
                Each stripe represents one year of data.")
 
 # Example data for download
-example_data = pd.DataFrame({
-    'Year': range(1981, 2021),
-    'EOBS': np.random.normal(0, 0.8, 40),
-    'ERA5': np.random.normal(0, 0.8, 40)
-})
+@st.cache_data
+def example_csv_bytes() -> bytes:
+    """Build the example CSV once instead of on every rerun"""
+    rng = np.random.default_rng(0)
+    example_data = pd.DataFrame({
+        'Year': range(1981, 2021),
+        'EOBS': rng.normal(0, 0.8, 40),
+        'ERA5': rng.normal(0, 0.8, 40)
+    })
+    return example_data.to_csv(index=False).encode('utf-8')
 
-csv = example_data.to_csv(index=False).encode('utf-8')
 st.sidebar.download_button(
     label="Download Example CSV",
-    data=csv,
+    data=example_csv_bytes(),
     file_name="precipitation_data_example.csv",
     mime="text/csv"
 )
 
 if uploaded_file is not None:
     try:
-        df = pd.read_csv(uploaded_file)
+        df = load_csv(uploaded_file.getvalue())
 
         if 'Year' not in df.columns:
             st.error("CSV must contain a 'Year' column")
@@ -71,7 +92,6 @@ if uploaded_file is not None:
         data_columns = [col for col in df.columns if col != 'Year']
         selected_column = st.selectbox("Select Dataset to Plot", data_columns)
 
-        df = df.sort_values('Year').reset_index(drop=True)
         min_year = df['Year'].min()
         max_year = df['Year'].max()
 
@@ -79,60 +99,69 @@ if uploaded_file is not None:
             st.dataframe(df.head(10))
             st.caption(f"Data range: {min_year} to {max_year} ({len(df)} years)")
 
-        fig, ax = plt.subplots(figsize=(15, stripe_height * 0.5))
+        fig = Figure(figsize=(15, stripe_height * 0.5))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
 
         vmin = color_min if set_color_range else df[selected_column].min()
         vmax = color_max if set_color_range else df[selected_column].max()
         norm = mcolors.Normalize(vmin=vmin, vmax=vmax)
         cmap = plt.get_cmap(colormap)
 
-        for i, row in df.iterrows():
-            color = cmap(norm(row[selected_column]))
-            ax.fill_between([i, i + 1], 0, 1, color=color)
+        values = df[selected_column].to_numpy(dtype=np.float32)[np.newaxis, :]
+        ax.imshow(values, aspect='auto', cmap=cmap, norm=norm,
+                  extent=(0, len(df), 0, 1), interpolation='nearest')
 
         ax.set_xlim(0, len(df))
         ax.set_ylim(0, 1)
-        ax.set_axis_off()
+        ax.spines[:].set_visible(False)
+        ax.set_yticks([])
+        ax.tick_params(axis='x', length=0)
 
         if show_years:
-            years = df['Year'].unique()
-            for i, year in enumerate(years):
-                if year % year_step == 0:
-                    ax.text(i + 0.5, -0.05, str(year),
-                            rotation=90, ha='center', va='top', fontsize=10, alpha=0.7)
+            years = df['Year'].to_numpy()
+            mask = years % year_step == 0
+            ax.set_xticks(np.nonzero(mask)[0] + 0.5)
+            ax.set_xticklabels(years[mask].astype(str), rotation=90, fontsize=10, alpha=0.7)
+        else:
+            ax.set_xticks([])
 
-        plt.title(f"{custom_title}: {selected_column} ({min_year} - {max_year})", fontsize=18, pad=20)
+        ax.set_title(f"{custom_title}: {selected_column} ({min_year} - {max_year})", fontsize=18, pad=20)
 
         # Add vertical colorbar
         sm = ScalarMappable(norm=norm, cmap=cmap)
         cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.03, pad=0.02)
         cbar.set_label(f"{selected_column} Anomaly [mm]", fontsize=12)
 
-        st.pyplot(fig)
-
         # Save file
         buf = io.BytesIO()
         if file_format == "PNG":
-            plt.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
+            fig.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
             mime_type = "image/png"
             file_ext = "png"
-        elif file_format == "SVG":
-            plt.savefig(buf, format="svg", bbox_inches='tight')
-            mime_type = "image/svg+xml"
-            file_ext = "svg"
-        elif file_format == "PDF":
-            plt.savefig(buf, format="pdf", bbox_inches='tight')
-            mime_type = "application/pdf"
-            file_ext = "pdf"
+        else:
+            fig.tight_layout()
+            file_ext = file_format.lower()
+            with matplotlib.rc_context({'path.simplify_threshold': 1.0}):
+                fig.savefig(buf, format=file_ext, dpi=dpi, metadata={})
+            mime_type = "image/svg+xml" if file_format == "SVG" else "application/pdf"
 
         buf.seek(0)
+
+        if file_format == "PNG":
+            st.image(buf.getvalue(), use_container_width=True)
+        else:
+            screen_buf = io.BytesIO()
+            fig.savefig(screen_buf, format="png", dpi=100)
+            st.image(screen_buf.getvalue(), use_container_width=True)
         filename = f"{custom_filename}_{selected_column}_{min_year}-{max_year}.{file_ext}"
 
         st.download_button(
             label=f"Download Your Image ({file_format})",
             data=buf,
             file_name=filename,
-            mime=mime_type
+            mime=mime_type,
+            on_click="ignore"
         )
 
     except Exception as e:
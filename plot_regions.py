@@ -1,12 +1,67 @@
 import streamlit as st
 import xarray as xr
 import numpy as np
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import cartopy.io.shapereader as shpreader
 import matplotlib.colors as mcolors
+from matplotlib.cm import ScalarMappable
 import os
+import io
+import hashlib
+
+def coord_slice(coord, lo, hi):
+    """Slice selecting [lo, hi] on an ascending or descending 1D coordinate"""
+    if coord.size > 1 and coord[0] > coord[-1]:
+        return slice(hi, lo)
+    return slice(lo, hi)
+
+@st.cache_resource
+def load_shapefile(path):
+    """Read the shapefile geometries once per path"""
+    shp = shpreader.Reader(path, encoding="cp1253", errors="ignore")
+    return [rec.geometry for rec in shp.records()]
+
+def open_nc(file_bytes):
+    """Open the upload lazily and keep it for this session until another file is uploaded"""
+    file_key = hashlib.md5(file_bytes).hexdigest()
+    if st.session_state.get('nc_key') != file_key:
+        if 'nc_data' in st.session_state:
+            st.session_state['nc_data'].close()
+        st.session_state['nc_data'] = xr.open_dataset(io.BytesIO(file_bytes), decode_times=False)
+        st.session_state['nc_key'] = file_key
+    return file_key, st.session_state['nc_data']
+
+@st.cache_data
+def read_nc_info(file_key, _data):
+    """Variable and coordinate names of the uploaded file"""
+    return list(_data.data_vars.keys()), list(_data.coords.keys())
+
+@st.cache_data
+def load_nc(file_key, _data, lat_name, lon_name, data_variable, p_value_variable,
+            lat_min, lat_max, lon_min, lon_max):
+    """Subset the region and extract the grids to plot, once per file and region"""
+    # Index slices read only the bounding box; masking is left for 2D coordinates
+    if _data[lat_name].ndim == 1 and _data[lon_name].ndim == 1:
+        subset = _data.sel({
+            lat_name: coord_slice(_data[lat_name].values, lat_min, lat_max),
+            lon_name: coord_slice(_data[lon_name].values, lon_min, lon_max)
+        })
+    else:
+        subset = _data.where(
+            (_data[lat_name] >= lat_min) & (_data[lat_name] <= lat_max) &
+            (_data[lon_name] >= lon_min) & (_data[lon_name] <= lon_max),
+            drop=True
+        )
+    lon_grid, lat_grid = np.meshgrid(subset[lon_name].values, subset[lat_name].values)
+    # Index before .values so only the first time step is read
+    precip = subset[data_variable][0, :, :].values if data_variable in subset else None
+    pvalue = subset[p_value_variable].values[:, :] if p_value_variable in subset else None
+    return lon_grid, lat_grid, precip, pvalue
 
 # --- Sidebar Inputs ---
 st.sidebar.header("Plot Settings")
@@ -67,11 +122,12 @@ st.markdown("Application to make maps for Precipitation Trends etc. Created by *
 if uploaded_file is not None:
     try:
         # Load the NetCDF file
-        data = xr.open_dataset(uploaded_file, decode_times=False)
+        file_key, data = open_nc(uploaded_file.getvalue())
+        data_vars, data_coords = read_nc_info(file_key, data)
         
         # Display dataset info
         st.subheader("Dataset Information")
-        st.write(f"Variables available: {list(data.data_vars.keys())}, Coordinates: {list(data.coords.keys())}")
+        st.write(f"Variables available: {data_vars}, Coordinates: {data_coords}")
        # st.write(f"Coordinates: {list(data.coords.keys())}")
 
         # Determine coordinate names based on user selection
@@ -81,9 +137,9 @@ if uploaded_file is not None:
             lat_name, lon_name = "lat", "lon"
         
         # Check if the selected coordinate names exist in the dataset
-        if lat_name not in data.coords or lon_name not in data.coords:
+        if lat_name not in data_coords or lon_name not in data_coords:
             st.error(f"Coordinates '{lat_name}' and/or '{lon_name}' not found in dataset.")
-            st.write(f"Available coordinates: {list(data.coords.keys())}")
+            st.write(f"Available coordinates: {data_coords}")
             st.info("Try changing the 'Coordinate Naming Convention' option.")
             st.stop()
         
@@ -95,38 +151,28 @@ if uploaded_file is not None:
         #)
 
 
-         # Subset the data for the specified area
-        subset = data.where(
-            (data[lat_name] >= lat_min) & (data[lat_name] <= lat_max) &
-            (data[lon_name] >= lon_min) & (data[lon_name] <= lon_max),
-            drop=True
+         # Subset the data for the specified area and extract the grids (cached)
+        lon_grid, lat_grid, precip, pvalue_data = load_nc(
+            file_key, data, lat_name, lon_name, data_variable, p_value_variable,
+            lat_min, lat_max, lon_min, lon_max
         )
         
-        # Extract data
-        try:
-            pvalue_data = subset[p_value_variable].values[:, :]
-        except:
+        if pvalue_data is None:
             st.warning(f"P-value variable '{p_value_variable}' not found in dataset")
-            pvalue_data = None
             
-        try:
-            precipitation_data = subset[data_variable].values[0, :, :] * scale_factor
-        except:
+        if precip is None:
             st.error(f"Data variable '{data_variable}' not found in dataset")
             st.stop()
-            
-        # Create 2D meshgrid for latitudes and longitudes
-        #lat = subset['latitude'].values
-        #lon = subset['longitude'].values
-        lat = subset[lat_name].values
-        lon = subset[lon_name].values
-        lon_grid, lat_grid = np.meshgrid(lon, lat)
+        # Single precision is enough for color mapping
+        precipitation_data = precip.astype(np.float32) * np.float32(scale_factor)
         
         # Create a map projection
         projection = ccrs.PlateCarree()
         
         # Plot the data
-        fig, ax = plt.subplots(subplot_kw={'projection': projection}, figsize=(fig_width, fig_height))
+        fig = Figure(figsize=(fig_width, fig_height))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(projection=projection)
         
         # Add map features
         ax.add_feature(cfeature.COASTLINE.with_scale('10m'), linewidth=0.5)
@@ -137,37 +183,38 @@ if uploaded_file is not None:
         # Ensure the map focuses on the correct region
         ax.set_extent([lon_min, lon_max, lat_min, lat_max], crs=ccrs.PlateCarree())
         
-        # Define levels and normalization
-        levels = np.linspace(vmin, vmax, num=41)
-        norm = mcolors.BoundaryNorm(boundaries=levels, ncolors=256)
+        # Continuous normalization; colors are mapped once (NaN cells stay transparent)
+        norm = mcolors.Normalize(vmin=vmin, vmax=vmax)
+        cmap = matplotlib.colormaps[cmap_name]
+        rgba = cmap(norm(precipitation_data))
         
         # Plot the precipitation data
-        filled_contour = ax.pcolormesh(lon_grid, lat_grid, precipitation_data, 
-                                      cmap=cmap_name, norm=norm, shading='auto')
+        filled_contour = ax.pcolormesh(lon_grid, lat_grid, rgba, shading='auto')
+        # Keep the data layer a single bitmap in vector output; coastlines stay vector
+        filled_contour.set_rasterized(True)
         
         # Add significance markers if requested and available
         if add_significance and pvalue_data is not None:
-            mask = pvalue_data < 0.05
-            ax.scatter(lon_grid[mask], lat_grid[mask], color='black', marker='.', 
-                      s=1, label='Statistical Significant')
+            # Stipple significant cells with contour hatching instead of one marker per cell
+            sig = (pvalue_data < 0.05).astype(np.uint8)
+            sig_contour = ax.contourf(lon_grid, lat_grid, sig, levels=[0.5, 1.5],
+                                      hatches=['..'], colors='none',
+                                      transform=ccrs.PlateCarree())
+            sig_contour.set_rasterized(True)
         
         # Overlay shapefile - GitHub compatible approach
         shapefile_path = os.path.join("shapefiles", shapefile_name)
         
         if os.path.exists(shapefile_path):
             try:
-                shp = shpreader.Reader(shapefile_path, encoding="cp1253", errors="ignore")
-                records = list(shp.records())
-                
-                for rec in records:
-                    geom = rec.geometry
-                    ax.add_geometries(
-                        [geom],
-                        crs=ccrs.PlateCarree(),
-                        edgecolor="black",
-                        facecolor="none",
-                        linewidth=0.3
-                    )
+                # All outlines share one style, so draw them as a single artist
+                ax.add_geometries(
+                    load_shapefile(shapefile_path),
+                    crs=ccrs.PlateCarree(),
+                    edgecolor="black",
+                    facecolor="none",
+                    linewidth=0.3
+                )
             except Exception as e:
                 st.warning(f"Could not load shapefile: {e}")
         else:
@@ -177,7 +224,7 @@ if uploaded_file is not None:
             ax.add_feature(cfeature.BORDERS.with_scale('50m'), linewidth=1)
         
         # Add a colorbar
-        cb = plt.colorbar(filled_contour, ax=ax, orientation='vertical')
+        cb = fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), ax=ax, orientation='vertical')
         cb.set_label(data_variable)
         
         # Add title with two lines
@@ -185,28 +232,28 @@ if uploaded_file is not None:
         ax.set_title(full_title, fontsize=14)
         
         # Set latitude and longitude ticks
-        ax.set_xticks(np.linspace(lon_min, lon_max, num=10))
-        ax.set_yticks(np.linspace(lat_min, lat_max, num=9))
+        xticks = np.linspace(lon_min, lon_max, num=10)
+        yticks = np.linspace(lat_min, lat_max, num=9)
+        ax.set_xticks(xticks)
+        ax.set_yticks(yticks)
         
         # Add tick labels
-        ax.set_xticklabels([f"{lon:.1f}°E" for lon in np.linspace(lon_min, lon_max, num=10)], fontsize=8)
-        ax.set_yticklabels([f"{lat:.1f}°N" for lat in np.linspace(lat_min, lat_max, num=9)], fontsize=8)
+        ax.set_xticklabels(np.char.mod("%.1f°E", xticks), fontsize=8)
+        ax.set_yticklabels(np.char.mod("%.1f°N", yticks), fontsize=8)
         
         # Add legend if significance markers are present
         if add_significance and pvalue_data is not None:
-            plt.legend(loc='lower left')
-        
-        # Display the plot
-        st.pyplot(fig)
+            handles, _ = sig_contour.legend_elements()
+            ax.legend(handles[:1], ['Statistical Significant'], loc='lower left')
         
-        # Save the plot
+        # Render once in memory, then show and offer the same PNG
         out_file = f"{output_file}.png"
-        plt.savefig(out_file, dpi=dpi, bbox_inches='tight')
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
+        st.image(buf.getvalue(), use_container_width=True)
         
         # Provide download button
-        st.success(f"✅ Figure saved as {out_file}")
-        with open(out_file, "rb") as f:
-            st.download_button("Download PNG", f, file_name=out_file)
+        st.download_button("Download PNG", buf.getvalue(), file_name=out_file, on_click="ignore")
             
     except Exception as e:
         st.error(f"An error occurred: {e}")